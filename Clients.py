@@ -0,0 +1,154 @@
+"""
+Clients
+-------
+Shared, cached LLM/embedding clients for all scripts in this project.
+
+Each module used to hardcode the API key at import time and build its own
+`ChatOpenAI`/`OpenAIEmbeddings` instance, which meant a fresh httpx
+connection pool (and TCP+TLS setup) per instance. Here a single keep-alive
+httpx client pair backs every cached instance, so connections are reused
+across calls — which also matters for sustaining the bounded-concurrency
+async paths.
+
+Environment variables expected (from the environment or a `.env` file):
+- `OPENAI_API_KEY`: API key for the OpenAI-compatible endpoint
+- `OPENAI_BASE`: Base URL for the OpenAI-compatible endpoint
+"""
+
+import functools
+import os
+import time
+
+import httpx
+import orjson
+from dotenv import load_dotenv
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from openai import AsyncOpenAI, OpenAI, APIConnectionError, APITimeoutError, RateLimitError
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+
+load_dotenv()
+
+# Shared retry policy for LLM/embedding calls: transient 429s and timeouts
+# back off exponentially with jitter instead of aborting the whole run (a
+# single flake used to cost a full reprocessing pass). Works on both sync
+# and async callables; combined with the concurrency semaphores, backoff
+# naturally lowers effective QPS when the endpoint pushes back.
+llm_retry = retry(
+    wait=wait_random_exponential(min=1, max=30),
+    stop=stop_after_attempt(6),
+    retry=retry_if_exception_type((RateLimitError, APITimeoutError, APIConnectionError)),
+)
+
+# Sized to comfortably cover the async semaphore bounds used by the scripts
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=64, max_connections=64)
+
+@functools.lru_cache
+def get_http_client():
+    """Shared sync httpx client with keep-alive connection pooling."""
+    return httpx.Client(limits=HTTP_LIMITS)
+
+@functools.lru_cache
+def get_async_http_client():
+    """Shared async httpx client with keep-alive connection pooling."""
+    return httpx.AsyncClient(limits=HTTP_LIMITS)
+
+@functools.lru_cache
+def get_llm(model="gpt-4o-mini", temperature=0.5, max_tokens=1000):
+    """Return a cached ChatOpenAI instance backed by the shared pools."""
+    return ChatOpenAI(
+        model=model,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        api_key=os.environ["OPENAI_API_KEY"],
+        base_url=os.environ["OPENAI_BASE"],
+        http_client=get_http_client(),
+        http_async_client=get_async_http_client(),
+    )
+
+@functools.lru_cache
+def get_embeddings(model="text-embedding-3-small"):
+    """Return a cached OpenAIEmbeddings instance backed by the shared pools."""
+    return OpenAIEmbeddings(
+        model=model,
+        api_key=os.environ["OPENAI_API_KEY"],
+        base_url=os.environ["OPENAI_BASE"],
+        http_client=get_http_client(),
+        http_async_client=get_async_http_client(),
+    )
+
+@functools.lru_cache
+def get_openai_client():
+    """Return a cached raw OpenAI client (Batch API, files, ...)."""
+    return OpenAI(
+        api_key=os.environ["OPENAI_API_KEY"],
+        base_url=os.environ["OPENAI_BASE"],
+        http_client=get_http_client(),
+    )
+
+@functools.lru_cache
+def get_async_openai_client():
+    """Return a cached raw AsyncOpenAI client for hot-path completions.
+
+    The raw client skips the per-call Pydantic validation and callback
+    overhead of the LangChain wrappers, which dominates when responses are
+    small and requests are fired in bulk.
+    """
+    return AsyncOpenAI(
+        api_key=os.environ["OPENAI_API_KEY"],
+        base_url=os.environ["OPENAI_BASE"],
+        http_client=get_async_http_client(),
+    )
+
+def run_chat_batch(prompts_by_id, model="gpt-4o-mini", temperature=0.5, max_tokens=1000,
+                   poll_interval=30, input_path="batch_input.jsonl"):
+    """Submit all prompts as one OpenAI Batch API job and collect the results.
+
+    Serializes the prompts into a JSONL request file, uploads it with
+    `purpose="batch"`, creates a `/v1/chat/completions` batch and polls until
+    it reaches a terminal status. Requests that fail land in the batch's
+    error file, so the returned mapping may be missing some ids; callers are
+    expected to handle that (e.g. by re-submitting the missing prompts).
+
+    Args:
+        prompts_by_id (dict): Mapping of custom id to prompt text.
+        model (str, optional): Chat model name. Defaults to "gpt-4o-mini".
+        temperature (float, optional): Decoding temperature. Defaults to 0.5.
+        max_tokens (int, optional): Completion token cap. Defaults to 1000.
+        poll_interval (int, optional): Seconds between status polls.
+        input_path (str, optional): Scratch file for the request JSONL; give
+            each caller its own name so concurrent runs don't clobber it.
+
+    Returns:
+        dict: Mapping of custom id (str) to response text.
+    """
+    client = get_openai_client()
+    with open(input_path, "wb") as f:
+        for custom_id, prompt in prompts_by_id.items():
+            f.write(orjson.dumps({
+                "custom_id": str(custom_id),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": model,
+                    "messages": [{"role": "user", "content": prompt}],
+                    "temperature": temperature,
+                    "max_tokens": max_tokens,
+                },
+            }) + b"\n")
+
+    with open(input_path, "rb") as f:
+        input_file = client.files.create(file=f, purpose="batch")
+    batch = client.batches.create(input_file_id=input_file.id, endpoint="/v1/chat/completions", completion_window="24h")
+
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        time.sleep(poll_interval)
+        batch = client.batches.retrieve(batch.id)
+    if batch.status != "completed":
+        raise RuntimeError(f"Batch {batch.id} finished with status {batch.status}")
+
+    # Results come back keyed by custom_id, not in submission order
+    contents = {}
+    for line in client.files.content(batch.output_file_id).text.splitlines():
+        result = orjson.loads(line)
+        contents[result["custom_id"]] = result["response"]["body"]["choices"][0]["message"]["content"]
+    return contents
@@ -13,21 +13,37 @@ Note: Credentials are read from environment variables (and optionally a `.env`
 file if present). Do not commit real secrets to source control.
 """
 
-import os
+import asyncio
+import json
+import orjson
+from Clients import get_async_openai_client, llm_retry, run_chat_batch
 
-os.environ["OPENAI_API_KEY"] = "voc-16184921971266774216506689a68e970a3c0.17240526"
-os.environ["OPENAI_BASE"] = "https://openai.vocareum.com/v1"
+# Offline job with no latency SLA: the Batch API halves cost and lifts rate
+# limits. Set to False to fall back to the per-request real-time path.
+USE_BATCH_API = False
 
-from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-import json
+# Cap on in-flight LLM requests; tune toward the account's QPM limit
+MAX_CONCURRENT_REQUESTS = 20
 
-load_dotenv()
+LISTING_PROMPT = """Generate a real estate listing with mock data and responde in with a single JSON object with the following fields:
+        neighborhood, price, bedrooms, bathrooms, size, description and neighborhood description. For exemple:
+        {
+            "neighborhood": "Green Oaks",
+            "price": "$800,000",
+            "bedrooms": "3",
+            "bathrooms": "2",
+            "size": "2,000 sqft",
+            "description": "A comfortable three-bedroom house with a spacious kitchen and a cozy living room.",
+            "neighborhood_description": "Green Oaks is a close-knit, environmentally-conscious community with access to organic grocery stores, community gardens, and bike paths. Take a stroll through the nearby Green Oaks Park or grab a cup of coffee at the cozy Green Bean Cafe. With easy access to public transportation and bike lanes, commuting is a breeze."
+        }
+        """
 
-llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.5, max_tokens=1000, api_key=os.environ["OPENAI_API_KEY"], base_url=os.environ["OPENAI_BASE"])
+@llm_retry
+async def get_response_async(prompt, temperature=0.5):
+    """Call the chat LLM with a prompt, via the raw async client.
 
-def get_response(prompt, temperature=0.5):
-    """Call the chat LLM with a prompt.
+    The raw client avoids the per-call validation and callback overhead of
+    the LangChain wrapper, which matters when requests are fired in bulk.
 
     Args:
         prompt (str): Natural language instruction/content sent to the LLM.
@@ -35,16 +51,64 @@ def get_response(prompt, temperature=0.5):
             randomness. Defaults to 0.5.
 
     Returns:
-        langchain.schema.messages.AIMessage: LLM response message. The textual
-        content is available via `response.content`.
+        openai.types.chat.ChatCompletionMessage: LLM response message. The
+        textual content is available via `response.content`.
     """
-    return llm.invoke(prompt, temperature=temperature)
+    response = await get_async_openai_client().chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": prompt}],
+        temperature=temperature,
+        max_tokens=1000,
+    )
+    return response.choices[0].message
+
+def extract_json_object(text):
+    """Extract the first JSON object from LLM output, or None.
+
+    Tolerates markdown fences, prose before the object and trailing junk
+    instead of requiring a fenced code block: the candidate between the first
+    `{` and the last `}` is parsed with orjson, and on failure an incremental
+    `raw_decode` from the first `{` accepts whatever trails the object.
 
-def generate_listings(amount=5):
-    """Generate a list of mock real estate listings and write to JSON.
+    Args:
+        text (str): Raw LLM response content.
 
-    The LLM is prompted to return a single JSON object per listing. We parse the
-    response and aggregate into a Python list, then persist to `listings.json`.
+    Returns:
+        dict | None: Parsed JSON object, or None when no object can be found.
+    """
+    start = text.find("{")
+    if start == -1:
+        return None
+    try:
+        return orjson.loads(text[start:text.rfind("}") + 1])
+    except orjson.JSONDecodeError:
+        pass
+    try:
+        # Incremental decode ignores trailing junk after the object
+        parsed, _ = json.JSONDecoder().raw_decode(text, start)
+        return parsed
+    except json.JSONDecodeError:
+        return None
+
+def normalize_listing(listing_id, parsed_response):
+    """Normalize a parsed LLM response into a consistent listing dict."""
+    return {
+        "id": listing_id,
+        "neighborhood": parsed_response["neighborhood"],
+        "price": parsed_response["price"],
+        "bedrooms": parsed_response["bedrooms"],
+        "bathrooms": parsed_response["bathrooms"],
+        "size": parsed_response["size"],
+        "description": parsed_response["description"],
+        "neighborhood_description": parsed_response["neighborhood_description"]
+    }
+
+def generate_listings_batch(amount=5):
+    """Generate listings through the Batch API and write to JSON.
+
+    Submits `amount` prompts in a single batch job, keeps the responses that
+    parse as JSON and tops up with further batches until `amount` listings are
+    collected (bounded by a retry budget, as in the sync path).
 
     Args:
         amount (int, optional): Number of listings to generate. Defaults to 5.
@@ -55,51 +119,73 @@ def generate_listings(amount=5):
     listings = []
     trys = 0
     while len(listings) < amount and trys < amount + 10:
-        trys += 1
-        prompt = f"""Generate a real estate listing with mock data and responde in with a single JSON object with the following fields: 
-        neighborhood, price, bedrooms, bathrooms, size, description and neighborhood description. For exemple:
-        {{
-            "neighborhood": "Green Oaks",
-            "price": "$800,000",
-            "bedrooms": "3",
-            "bathrooms": "2",
-            "size": "2,000 sqft",
-            "description": "A comfortable three-bedroom house with a spacious kitchen and a cozy living room.",
-            "neighborhood_description": "Green Oaks is a close-knit, environmentally-conscious community with access to organic grocery stores, community gardens, and bike paths. Take a stroll through the nearby Green Oaks Park or grab a cup of coffee at the cozy Green Bean Cafe. With easy access to public transportation and bike lanes, commuting is a breeze."
-        }}
-        """
-        # Query the LLM for a single listing in JSON format
-        response = get_response(prompt, temperature=0.85)
-        if "```json" in response.content:
-            response.content = response.content.replace("```json", "").replace("```", "")
-        else:
-            print(f"Error parsing response {trys}: {response.content}")
-            continue
-
-        try:
-            # Parse the JSON object returned by the LLM
-            parsed_response = json.loads(response.content)
-        except json.JSONDecodeError:
-            print(f"Error parsing response {trys}: {response.content}")
-            continue
-
-        # Normalize the listing into a consistent dict structure
-        listings.append({
-            "id": trys,
-            "neighborhood": parsed_response["neighborhood"],
-            "price": parsed_response["price"],
-            "bedrooms": parsed_response["bedrooms"],
-            "bathrooms": parsed_response["bathrooms"],
-            "size": parsed_response["size"],
-            "description": parsed_response["description"],
-            "neighborhood_description": parsed_response["neighborhood_description"]
-        })
+        missing = amount - len(listings)
+        contents = run_chat_batch(
+            {trys + i: LISTING_PROMPT for i in range(missing)},
+            temperature=0.85,
+            input_path="batch_input_listings.jsonl",
+        )
+        trys += missing
+        for custom_id in sorted(contents, key=int):
+            content = contents[custom_id]
+            parsed_response = extract_json_object(content)
+            if parsed_response is None:
+                print(f"Error parsing response {custom_id}: {content}")
+                continue
+            listings.append(normalize_listing(len(listings) + 1, parsed_response))
+
+    print("Number of listings: ", len(listings))
+
+    # Persist generated listings for downstream steps
+    with open("listings.json", "wb") as f:
+        f.write(orjson.dumps(listings))
+
+async def generate_listings(amount=5):
+    """Generate a list of mock real estate listings and write to JSON.
+
+    The LLM is prompted to return a single JSON object per listing. Requests
+    are fired concurrently (bounded by a semaphore), responses that fail to
+    parse are retried in the next wave, and generation stops once `amount`
+    valid listings are collected or the retry budget is spent.
+
+    Args:
+        amount (int, optional): Number of listings to generate. Defaults to 5.
+
+    Side effects:
+        Writes the resulting list to `listings.json` in the current directory.
+    """
+    sem = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+    async def one():
+        """Request a single listing; return the parsed dict or None."""
+        async with sem:
+            response = await get_response_async(LISTING_PROMPT, temperature=0.85)
+        # Parse the JSON object returned by the LLM
+        parsed = extract_json_object(response.content)
+        if parsed is None:
+            print(f"Error parsing response: {response.content}")
+        return parsed
+
+    parsed_listings = []
+    trys = 0
+    while len(parsed_listings) < amount and trys < amount + 10:
+        # Fire one in-flight wave per missing listing; failures retry next wave
+        missing = amount - len(parsed_listings)
+        trys += missing
+        batch = await asyncio.gather(*[one() for _ in range(missing)])
+        parsed_listings.extend([parsed for parsed in batch if parsed is not None])
+
+    # Assign ids after collection so retries don't leave holes
+    listings = [normalize_listing(i + 1, parsed) for i, parsed in enumerate(parsed_listings[:amount])]
 
     print("Number of listings: ", len(listings))
-    
+
     # Persist generated listings for downstream steps
-    with open("listings.json", "w") as f:
-        json.dump(listings, f)
+    with open("listings.json", "wb") as f:
+        f.write(orjson.dumps(listings))
 
 if __name__ == "__main__":
-    generate_listings(100)
\ No newline at end of file
+    if USE_BATCH_API:
+        generate_listings_batch(100)
+    else:
+        asyncio.run(generate_listings(100))
\ No newline at end of file
@@ -13,26 +13,26 @@ Components:
 
 Environment variables expected:
 - `OPENAI_API_KEY`: API key for the OpenAI-compatible endpoint
-- `OPENAI_API_BASE`: Base URL for the OpenAI-compatible endpoint
+- `OPENAI_BASE`: Base URL for the OpenAI-compatible endpoint
 """
 
 import os
-
-os.environ["OPENAI_API_KEY"] = "voc-16184921971266774216506689a68e970a3c0.17240526"
-os.environ["OPENAI_API_BASE"] = "https://openai.vocareum.com/v1"
-
-from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-import json
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
+import hashlib
+import asyncio
+import faiss
+import numpy as np
+import orjson
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
 from langchain_core.documents import Document
+from Clients import get_llm, get_embeddings, llm_retry
+from LLMCache import semantic_cache
 
-load_dotenv()
+llm = get_llm(temperature=0.7)
 
-llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.7, max_tokens=1000, api_key=os.environ["OPENAI_API_KEY"], base_url=os.environ["OPENAI_API_BASE"])
-
-def get_response(prompt, temperature=0.7):
+@semantic_cache
+@llm_retry
+async def get_response_async(prompt, temperature=0.7):
     """Call the chat LLM with a prompt.
 
     Args:
@@ -41,10 +41,197 @@ def get_response(prompt, temperature=0.7):
             randomness. Defaults to 0.7.
 
     Returns:
-        langchain.schema.messages.AIMessage: LLM response message. The textual
-        content is available via `response.content`.
+        langchain.schema.messages.AIMessage: LLM response message.
+    """
+    return await llm.ainvoke(prompt, temperature=temperature)
+
+# Embed and insert in batches of a few hundred documents
+EMBED_BATCH_SIZE = 250
+
+# How many nearest neighbors to warm the cache for after serving a query,
+# and how many prefetch LLM calls may run at once. The low concurrency
+# bound keeps prefetch from starving user-facing calls.
+PREFETCH_NEIGHBORS = 10
+PREFETCH_CONCURRENCY = 5
+
+# On-disk location for the persisted FAISS indexes
+FAISS_DB_DIR = "./faiss_db"
+
+def file_digest(path):
+    """Return the sha256 hex digest of a file's contents."""
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def dedupe_listings(listings, source_digest, store_path="listing_hashes.json"):
+    """Drop listings whose content duplicates an earlier one.
+
+    Regenerating `listings.json` can produce identical listings under new
+    ids; each duplicate would be embedded and indexed again. Listings are
+    keyed by the sha256 of their content (id excluded, keys sorted) and only
+    the first occurrence of each hash is kept. The hash-to-id map is
+    persisted alongside the source file's digest: it is only trusted while
+    the digest matches, since a regenerated file rebuilds the index from
+    scratch and stale hashes would drop content that is no longer indexed
+    under any id.
+
+    Args:
+        listings (list[dict]): Listings as loaded from `listings.json`.
+        source_digest (str): Digest of the `listings.json` the listings came
+            from, used to invalidate the persisted map.
+        store_path (str, optional): Where the hash-to-id map is persisted.
+
+    Returns:
+        list[dict]: Listings with content duplicates removed.
+    """
+    seen = {}
+    try:
+        with open(store_path, "rb") as f:
+            stored = orjson.loads(f.read())
+        if stored.get("source_digest") == source_digest:
+            seen = stored["hashes"]
+    except FileNotFoundError:
+        pass
+
+    unique_listings = []
+    for listing in listings:
+        content = {k: v for k, v in listing.items() if k != "id"}
+        h = hashlib.sha256(orjson.dumps(content, option=orjson.OPT_SORT_KEYS)).hexdigest()
+        if h in seen and seen[h] != listing["id"]:
+            # Same content already kept under another id
+            continue
+        seen[h] = listing["id"]
+        unique_listings.append(listing)
+
+    with open(store_path, "wb") as f:
+        f.write(orjson.dumps({"source_digest": source_digest, "hashes": seen}))
+    return unique_listings
+
+def build_vectorstore(documents, index_name, embeddings):
+    """Index documents into a persisted FAISS index with batched inserts.
+
+    FAISS scales linearly on the write-once/query-many workload here, where
+    Chroma's add path degrades past tens of thousands of vectors. Accepts
+    any iterable of documents (including generators): each batch is embedded
+    with one `embed_documents` call.
+
+    Vectors are stored in an INT8 scalar-quantized HNSW index
+    (`IndexHNSWSQ`): FAISS encodes the FP32 embeddings to int8 internally
+    and dequantizes on the fly during search, roughly quartering the index
+    footprint and speeding up the bandwidth-bound graph traversal for under
+    1% recall loss. The quantizer needs a training pass over the corpus, so
+    the embedded vectors are held until all batches are in.
+
+    The index is saved under `FAISS_DB_DIR/index_name`; since `index_name`
+    carries the source file's digest, an unchanged input reloads from disk
+    with zero embedding calls and a changed input rebuilds from scratch.
+
+    Args:
+        documents (Iterable[Document]): Documents to index; each must carry
+            an `id` entry in its metadata.
+        index_name (str): Directory name for the saved index, keyed by the
+            source file digest.
+        embeddings (OpenAIEmbeddings): Embedding model used for documents and
+            later queries.
+
+    Returns:
+        FAISS: LangChain vectorstore wrapper over the populated index.
+    """
+    index_dir = os.path.join(FAISS_DB_DIR, index_name)
+    if os.path.isdir(index_dir):
+        vectorstore = FAISS.load_local(index_dir, embeddings, allow_dangerous_deserialization=True)
+        print(f"Index {index_name}: loaded {vectorstore.index.ntotal} vectors from disk")
+        return vectorstore
+
+    text_embeddings = []
+    metadatas = []
+    ids = []
+
+    def flush(batch):
+        texts = [document.page_content for document in batch]
+        text_embeddings.extend(zip(texts, embeddings.embed_documents(texts)))
+        metadatas.extend(document.metadata for document in batch)
+        ids.extend(str(document.metadata["id"]) for document in batch)
+
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) == EMBED_BATCH_SIZE:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    # Train the scalar quantizer on the full corpus, then add through the
+    # LangChain wrapper so the docstore mapping is built alongside
+    vectors = np.asarray([vector for _, vector in text_embeddings], dtype=np.float32)
+    index = faiss.IndexHNSWSQ(vectors.shape[1], faiss.ScalarQuantizer.QT_8bit, 32)
+    index.train(vectors)
+    vectorstore = FAISS(embedding_function=embeddings, index=index, docstore=InMemoryDocstore(), index_to_docstore_id={})
+    for i in range(0, len(text_embeddings), EMBED_BATCH_SIZE):
+        vectorstore.add_embeddings(text_embeddings[i:i + EMBED_BATCH_SIZE], metadatas=metadatas[i:i + EMBED_BATCH_SIZE], ids=ids[i:i + EMBED_BATCH_SIZE])
+
+    vectorstore.save_local(index_dir)
+    print(f"Index {index_name}: built with {vectorstore.index.ntotal} vectors")
+    return vectorstore
+
+def mmr_select(query_vector, candidate_vectors, k=2, lambda_mult=0.5):
+    """Select k candidate indices by maximal marginal relevance, vectorized.
+
+    All similarities are computed as BLAS matrix products on float32 arrays
+    (one `C @ q` for relevance, one `C @ C[selected].T` per pick for
+    redundancy) instead of per-pair Python loops.
+
+    Args:
+        query_vector (np.ndarray): Query embedding, shape (d,).
+        candidate_vectors (np.ndarray): Candidate embeddings, shape (n, d).
+        k (int, optional): Number of candidates to select.
+        lambda_mult (float, optional): Relevance/diversity trade-off in
+            [0, 1]; 1 is pure relevance.
+
+    Returns:
+        list[int]: Indices into `candidate_vectors`, in selection order.
     """
-    return llm.invoke(prompt, temperature=temperature)
+    candidates = candidate_vectors / np.linalg.norm(candidate_vectors, axis=1, keepdims=True)
+    query = query_vector / np.linalg.norm(query_vector)
+    relevance = candidates @ query
+
+    selected = [int(np.argmax(relevance))]
+    while len(selected) < min(k, len(candidates)):
+        redundancy = (candidates @ candidates[selected].T).max(axis=1)
+        score = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        score[selected] = -np.inf
+        selected.append(int(np.argmax(score)))
+    return selected
+
+def retrieve(vectorstore, query_vector, k=2, fetch_k=20, lambda_mult=0.5):
+    """Retrieve top-k documents for a precomputed query embedding.
+
+    Takes the embedding rather than the query text so the (single) query
+    vector computed in `main` can be reused across every store instead of
+    being re-embedded per search. A pool of `fetch_k` candidates is pulled
+    from the FAISS index and re-ranked down to `k` with the vectorized MMR
+    selector above.
+
+    Args:
+        vectorstore (FAISS): Store to search.
+        query_vector (list[float]): Embedding of the user query.
+        k (int, optional): Number of results after MMR re-ranking.
+        fetch_k (int, optional): Size of the candidate pool fed to MMR.
+        lambda_mult (float, optional): MMR relevance/diversity trade-off.
+
+    Returns:
+        list[Document]: Top-k documents, diversity re-ranked.
+    """
+    query = np.asarray(query_vector, dtype=np.float32)
+    _, indices = vectorstore.index.search(query.reshape(1, -1), fetch_k)
+    indices = [int(i) for i in indices[0] if i != -1]
+    candidates = np.asarray([vectorstore.index.reconstruct(i) for i in indices], dtype=np.float32)
+
+    documents = []
+    for pick in mmr_select(query, candidates, k=k, lambda_mult=lambda_mult):
+        docstore_id = vectorstore.index_to_docstore_id[indices[pick]]
+        documents.append(vectorstore.docstore.search(docstore_id))
+    return documents
 
 def main():
     """Run the HomeMatch pipeline.
@@ -58,35 +245,36 @@ def main():
     """
 
     # Generating Real Estate Listings
-    with open("listings.json", "r") as f:
-        listings = json.load(f)
+    listings_digest = file_digest("listings.json")
+    with open("listings.json", "rb") as f:
+        listings = orjson.loads(f.read())
+    # Skip content duplicates so they are not embedded and indexed twice
+    listings = dedupe_listings(listings, listings_digest)
 
     # Storing Listings in a Vector Database
     # Raw vectorstore: embed the full listing JSON (except ID) as `page_content`.
     raw_documents = [
-        Document(page_content=json.dumps({k: v for k, v in listing.items() if k != "id"}, ensure_ascii=False), 
+        Document(page_content=orjson.dumps({k: v for k, v in listing.items() if k != "id"}).decode(),
         metadata={"id": listing["id"], "neighborhood": listing["neighborhood"], "price": listing["price"]}
         )
         for listing in listings
     ]
     print("Number of raw documents: ", len(raw_documents))
-    raw_vectorstore = Chroma.from_documents(
-        raw_documents,
-        embedding=OpenAIEmbeddings(model="text-embedding-3-small"),
-        collection_name="raw_listings"
-    )
-
-    with open("semantic_enhanced_listings.txt", "r") as f:
-        semantic_enhanced_documents = [Document(page_content=line, metadata={"id": line.split(",")[0].split(":")[1]}) for line in f.readlines()]
-
-    print("Number of semantic enhanced documents: ", len(semantic_enhanced_documents))
-    semantic_enhanced_vectorstore = Chroma.from_documents(
-        semantic_enhanced_documents,
-        embedding=OpenAIEmbeddings(model="text-embedding-3-small"),
-        collection_name="semantic_listings"
-    )
-        
-        
+    embeddings = get_embeddings()
+    # Indexes persist across runs, so re-running main() costs no embedding
+    # calls. Index names are keyed by the input file's digest so a changed
+    # input rebuilds instead of serving stale vectors.
+    raw_vectorstore = build_vectorstore(raw_documents, f"raw_listings_{listings_digest[:12]}", embeddings)
+
+    def semantic_enhanced_documents():
+        # Lazy line iteration: no full-file read, no intermediate list
+        with open("semantic_enhanced_listings.jsonl", "rb") as f:
+            for line in f:
+                record = orjson.loads(line)
+                page_content = f"converted description: {record['converted']}, original description: {record['original']}, neighborhood_description: {record['neighborhood']}"
+                yield Document(page_content=page_content, metadata={"id": record["id"]})
+
+    semantic_enhanced_vectorstore = build_vectorstore(semantic_enhanced_documents(), f"semantic_listings_{file_digest('semantic_enhanced_listings.jsonl')[:12]}", embeddings)
 
     # Building the User Preference Interface
     # For demo purposes, we hardcode questions/answers. In production, collect from a UI.
@@ -113,17 +301,21 @@ def main():
     print("Preferences: ", preferences, "\n\n")
 
     # Searching Based on Preferences
+    # Embed the query exactly once; the vector is reused for every store
+    # searched below (and could feed any further re-ranking)
+    query_vector = embeddings.embed_query(preferences)
+
     # Retrieve from raw index (structured JSON text)
     print("Step 5: Searching Based on Preferences")
-    similarity_search_raw_vectorstore = raw_vectorstore.similarity_search(preferences, k=2)
+    similarity_search_raw_vectorstore = retrieve(raw_vectorstore, query_vector)
     for document in similarity_search_raw_vectorstore:
         print(document.page_content, "\n")
 
     #Listing Retrieval Logic: Fine-tune the retrieval algorithm to ensure that the most relevant listings are selected based on the semantic closeness to the buyer’s preferences.
-    # Retrieve from semantic index (LLM-generated prose). In a more advanced system,
-    # you could fetch a larger candidate set and re-rank by domain-specific criteria.
+    # Retrieve from semantic index (LLM-generated prose): fetch a larger
+    # candidate pool and re-rank with MMR so the top-K stays diverse.
     print("\n\nListing Retrieval Logic")
-    similarity_search_semantic_enhanced_vectorstore = semantic_enhanced_vectorstore.similarity_search(preferences, k=2)
+    similarity_search_semantic_enhanced_vectorstore = retrieve(semantic_enhanced_vectorstore, query_vector)
     for document in similarity_search_semantic_enhanced_vectorstore:
         print(document.page_content, "\n")
 
@@ -142,11 +334,45 @@ def main():
 
         Return the final description in a single string.
         """
-    for document in similarity_search_raw_vectorstore:
+    async def personalize(document):
         # Personalize the listing description using the user's preferences
-        response = get_response(prompt.format(listing_description=document.page_content, user_preferences_description=preferences), temperature=0.5)
-        print("Listing Enhanced: ", document.metadata["neighborhood"], document.metadata["price"])
-        print(response.content, "\n")
+        return document, await get_response_async(prompt.format(listing_description=document.page_content, user_preferences_description=preferences), temperature=0.5)
+
+    async def personalize_all(documents):
+        return await asyncio.gather(*[personalize(document) for document in documents])
+
+    # Warm the semantic cache for the next nearest neighbors of the current
+    # preferences: sessions with similar preferences tend to re-touch the
+    # same popular listings, so their personalization becomes a cache hit.
+    # Runs after results are delivered, bounded so it never competes with
+    # user-facing calls.
+    async def prefetch_all(documents):
+        prefetch_semaphore = asyncio.Semaphore(PREFETCH_CONCURRENCY)
+
+        async def prefetch_one(document):
+            async with prefetch_semaphore:
+                await get_response_async(prompt.format(listing_description=document.page_content, user_preferences_description=preferences), temperature=0.5)
+
+        await asyncio.gather(*[prefetch_one(document) for document in documents])
+
+    shown_ids = {document.metadata["id"] for document in similarity_search_raw_vectorstore}
+    prefetch_documents = [
+        document for document in retrieve(raw_vectorstore, query_vector, k=PREFETCH_NEIGHBORS, fetch_k=2 * PREFETCH_NEIGHBORS)
+        if document.metadata["id"] not in shown_ids
+    ]
+
+    # Single event loop for both phases: the shared AsyncClient's keep-alive
+    # connections are bound to the loop they were opened on, so a second
+    # asyncio.run would find them attached to a closed loop
+    async def augment_and_prefetch():
+        # One round-trip for all retrieved listings instead of k sequential
+        # calls; gather preserves submission order for printing
+        for document, response in await personalize_all(similarity_search_raw_vectorstore):
+            print("Listing Enhanced: ", document.metadata["neighborhood"], document.metadata["price"])
+            print(response.content, "\n")
+        await prefetch_all(prefetch_documents)
+
+    asyncio.run(augment_and_prefetch())
 
     # Step 7: Deliverables and Testing
 
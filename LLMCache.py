@@ -0,0 +1,144 @@
+"""
+LLMCache
+--------
+Semantic response cache for LLM calls, shared by the generation scripts and
+the HomeMatch pipeline.
+
+Lookup strategy (cheapest first):
+1. Exact match: `sha256(prompt)` against a local `shelve` key-value store
+2. Semantic match: embed the prompt and ANN-search a small local Chroma
+   "prompt_cache" collection; reuse the stored completion when the distance
+   is below `SIMILARITY_THRESHOLD`
+3. Miss: call the LLM and store both the exact hash and the embedding
+
+Cache hits skip the LLM entirely, which eliminates the full request cost on
+re-runs (listing JSON rarely changes between notebook iterations).
+"""
+
+import hashlib
+import shelve
+import asyncio
+import threading
+
+from langchain_chroma import Chroma
+from langchain_core.messages import AIMessage
+from Clients import get_embeddings
+
+# Chroma returns a distance, so smaller is closer; 0.05 keeps only
+# near-identical prompts
+SIMILARITY_THRESHOLD = 0.05
+
+EXACT_CACHE_PATH = "llm_cache"
+SEMANTIC_CACHE_DIR = "./prompt_cache"
+
+_prompt_cache = None
+
+# Serializes shelve access: the async path reaches the store from worker
+# threads, and shelve is not safe for concurrent open/write
+_store_lock = threading.Lock()
+
+def _get_prompt_cache():
+    global _prompt_cache
+    if _prompt_cache is None:
+        _prompt_cache = Chroma(
+            collection_name="prompt_cache",
+            embedding_function=get_embeddings(),
+            persist_directory=SEMANTIC_CACHE_DIR,
+        )
+    return _prompt_cache
+
+def _exact_get(key):
+    with _store_lock:
+        with shelve.open(EXACT_CACHE_PATH) as store:
+            return store.get(key)
+
+def _exact_put(key, completion):
+    with _store_lock:
+        with shelve.open(EXACT_CACHE_PATH) as store:
+            store[key] = completion
+
+def _semantic_get(vector):
+    hits = _get_prompt_cache().similarity_search_by_vector_with_relevance_scores(vector, k=1)
+    if hits and hits[0][1] < SIMILARITY_THRESHOLD:
+        return hits[0][0].metadata["completion"]
+    return None
+
+def _semantic_put(key, prompt, vector, completion):
+    _get_prompt_cache()._collection.add(
+        ids=[key],
+        embeddings=[vector],
+        documents=[prompt],
+        metadatas=[{"completion": completion}],
+    )
+
+def _lookup(prompt, vector=None):
+    """Return (key, vector, completion) for `prompt`; completion is None on a miss.
+
+    The prompt embedding is computed at most once: callers may pass a
+    precomputed `vector`, and the vector used for the similarity lookup is
+    returned so `_store` can reuse it instead of embedding again.
+    """
+    key = hashlib.sha256(prompt.encode()).hexdigest()
+    cached = _exact_get(key)
+    if cached is not None:
+        return key, vector, cached
+
+    # Exact miss: embed once and reuse the vector for search and store
+    if vector is None:
+        vector = get_embeddings().embed_query(prompt)
+    return key, vector, _semantic_get(vector)
+
+def _store(key, prompt, vector, completion):
+    """Record a fresh completion under both the exact and semantic indexes."""
+    _exact_put(key, completion)
+    if vector is None:
+        vector = get_embeddings().embed_query(prompt)
+    _semantic_put(key, prompt, vector, completion)
+
+async def _alookup(prompt, vector=None):
+    """Async `_lookup`: embeds via aembed_query and keeps blocking store I/O
+    off the event loop so concurrent tasks aren't serialized behind it."""
+    key = hashlib.sha256(prompt.encode()).hexdigest()
+    cached = await asyncio.to_thread(_exact_get, key)
+    if cached is not None:
+        return key, vector, cached
+
+    if vector is None:
+        vector = await get_embeddings().aembed_query(prompt)
+    return key, vector, await asyncio.to_thread(_semantic_get, vector)
+
+async def _astore(key, prompt, vector, completion):
+    """Async `_store`; see `_alookup`."""
+    await asyncio.to_thread(_exact_put, key, completion)
+    if vector is None:
+        vector = await get_embeddings().aembed_query(prompt)
+    await asyncio.to_thread(_semantic_put, key, prompt, vector, completion)
+
+def semantic_cache(func):
+    """Decorator caching LLM responses by exact hash, then embedding similarity.
+
+    Works for both sync and async `get_response`-style callables taking the
+    prompt as first argument and returning an `AIMessage`. Cached entries are
+    replayed as `AIMessage` objects so callers keep using `response.content`.
+    Callers that already hold the prompt's embedding can pass it as the
+    keyword-only `prompt_vector` to skip the embedding call entirely.
+    """
+    if asyncio.iscoroutinefunction(func):
+        async def wrapper(prompt, *args, prompt_vector=None, **kwargs):
+            key, vector, cached = await _alookup(prompt, vector=prompt_vector)
+            if cached is not None:
+                return AIMessage(content=cached)
+            response = await func(prompt, *args, **kwargs)
+            await _astore(key, prompt, vector, response.content)
+            return response
+    else:
+        def wrapper(prompt, *args, prompt_vector=None, **kwargs):
+            key, vector, cached = _lookup(prompt, vector=prompt_vector)
+            if cached is not None:
+                return AIMessage(content=cached)
+            response = func(prompt, *args, **kwargs)
+            _store(key, prompt, vector, response.content)
+            return response
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper